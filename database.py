@@ -5,9 +5,14 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+import asyncio
+from bson import ObjectId
+from bson.errors import InvalidDocument
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, WriteError
 from datetime import datetime, timezone
 import os
+import logging
 from dotenv import load_dotenv
 from typing import Union
 from pydantic import BaseModel
@@ -15,22 +20,69 @@ from pydantic import BaseModel
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 _client = None
 db = None
 
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+def connect():
+    """Open the Mongo client; call once per worker process, after any fork"""
+    global _client, db
+    if _client is None and database_url and database_name:
+        _client = AsyncIOMotorClient(database_url)
+        db = _client[database_name]
+
+def close():
+    """Close the Mongo client opened by connect()"""
+    global _client, db
+    if _client is not None:
+        _client.close()
+    _client = None
+    db = None
+
+INDEXES = [
+    ("user", "email", {"unique": True}),
+    ("workoutplan", [("trainer_id", 1), ("client_id", 1), ("is_active", 1)], {}),
+    ("mealplan", [("trainer_id", 1), ("client_id", 1), ("is_active", 1)], {}),
+    ("message", "conversation_id", {}),
+    ("dailylog", "client_id", {}),
+]
+
+# Whether the unique user.email index is known to exist; until then callers must check for duplicates
+unique_email_index = False
+
+async def create_indexes():
+    """Create the indexes backing the API's hot queries, logging any that fail"""
+    global unique_email_index
+    if db is None:
+        return
+
+    for collection_name, keys, options in INDEXES:
+        try:
+            await db[collection_name].create_index(keys, **options)
+            if (collection_name, keys) == ("user", "email"):
+                unique_email_index = True
+        except ConnectionFailure:
+            # Every other index would wait out the same server selection timeout
+            logger.exception("MongoDB unreachable; skipping index creation")
+            return
+        except Exception:
+            logger.exception("Failed to create index %s on %s", keys, collection_name)
 
 # Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
     """Insert a single document with timestamp"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
+    data_dict = _prepare_document(data)
+    await db[collection_name].insert_one(data_dict)
+    return data_dict['id_hex']
+
+def _prepare_document(data: Union[BaseModel, dict]) -> dict:
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
@@ -40,16 +92,131 @@ def create_document(collection_name: str, data: Union[BaseModel, dict]):
     data_dict['created_at'] = datetime.now(timezone.utc)
     data_dict['updated_at'] = datetime.now(timezone.utc)
 
-    result = db[collection_name].insert_one(data_dict)
-    return str(result.inserted_id)
+    # Store the string id alongside _id so reads can skip the conversion
+    data_dict.setdefault('_id', ObjectId())
+    data_dict['id_hex'] = str(data_dict['_id'])
+    return data_dict
+
+class BatchWriter:
+    """Coalesce concurrent inserts into one collection into insert_many calls.
+
+    Ids are generated locally, so each caller only waits for the batch its
+    document landed in rather than for a round-trip of its own.
+    """
+
+    def __init__(self, collection_name: str, max_batch: int = 100, max_wait: float = 0.01):
+        self.collection_name = collection_name
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue = None
+        self._task = None
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
-    """Get documents from collection"""
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush queued documents and stop the background writer"""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        await self._queue.put(None)
+        await task
+
+    async def insert(self, data: Union[BaseModel, dict]) -> str:
+        """Queue a document for insertion and wait until its batch is written"""
+        if self._task is None:
+            return await create_document(self.collection_name, data)
+        if db is None:
+            raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+        data_dict = _prepare_document(data)
+        done = asyncio.get_running_loop().create_future()
+        await self._queue.put((data_dict, done))
+        await done
+        return data_dict['id_hex']
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            # One deadline per batch, so a trickle of items cannot keep it open
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    await self._write(batch)
+                    return
+                batch.append(item)
+            await self._write(batch)
+
+    async def _write(self, batch: list):
+        collection = db[self.collection_name]
+        failed = {}
+        try:
+            await collection.insert_many([doc for doc, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            # Unordered writes keep going past errors; fail only the rejected documents
+            for error in e.details.get("writeErrors", []):
+                error_cls = DuplicateKeyError if error.get("code") == 11000 else WriteError
+                failed[error["index"]] = error_cls(error.get("errmsg"), error.get("code"), error)
+        except InvalidDocument:
+            # Retry one by one so only the unencodable document's caller sees the error
+            for doc, done in batch:
+                try:
+                    await collection.insert_one(doc)
+                except DuplicateKeyError as e:
+                    # Already written by the failed insert_many before it stopped
+                    _settle(done, None if "_id" in (e.details or {}).get("keyValue", {}) else e)
+                except Exception as e:
+                    _settle(done, e)
+                else:
+                    _settle(done)
+            return
+        except Exception as e:
+            # Connection failures and the like affect every document alike; retrying would only stall the queue
+            for _, done in batch:
+                _settle(done, e)
+            return
+
+        for index, (_, done) in enumerate(batch):
+            _settle(done, failed.get(index))
+
+def _settle(done: asyncio.Future, error: Exception = None):
+    if done.done():
+        return
+    if error is None:
+        done.set_result(None)
+    else:
+        done.set_exception(error)
+
+def find_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get a cursor over documents from collection, with a string `id` in place of `_id`"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
     
-    cursor = db[collection_name].find(filter_dict or {})
+    pipeline = [{"$match": filter_dict or {}}]
     if limit:
-        cursor = cursor.limit(limit)
+        pipeline.append({"$limit": limit})
+    # Older documents have no id_hex, so fall back to converting _id server-side
+    pipeline.append({"$addFields": {"id": {"$ifNull": ["$id_hex", {"$toString": "$_id"}]}}})
+    if projection:
+        pipeline.append({"$project": {**projection, "id": 1, "_id": 0}})
+    else:
+        pipeline.append({"$project": {"_id": 0, "id_hex": 0}})
     
-    return list(cursor)
+    return db[collection_name].aggregate(pipeline)
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None, projection: dict = None):
+    """Get documents from collection, optionally restricted to the projected fields"""
+    cursor = find_documents(collection_name, filter_dict, limit=limit, projection=projection)
+    return await cursor.to_list(length=None)
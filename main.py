@@ -1,38 +1,129 @@
 import os
-from fastapi import FastAPI, HTTPException
+from functools import lru_cache
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from typing import List, Optional
+from pydantic import TypeAdapter
+import orjson
+from cachetools import TTLCache
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 
-from database import db, create_document, get_documents
-from schemas import User, WorkoutPlan, MealPlan, Message, DailyLog
+import database
+from database import BatchWriter, create_document, get_documents, find_documents, create_indexes
+from schemas import User, WorkoutPlan, MealPlan, Message, DailyLog, UserOut
 
-app = FastAPI(title="Gym Coach Platform API")
+# Mongo hands back naive UTC datetimes; tag them as UTC when encoding
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+
+class UTCORJSONResponse(ORJSONResponse):
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+app = FastAPI(title="Gym Coach Platform API", default_response_class=UTCORJSONResponse)
+
+app.add_middleware(GZipMiddleware, minimum_size=500)
+
+# Comma-separated origin whitelist, e.g. "https://app.example.com,https://admin.example.com"
+cors_origins = [o.strip() for o in os.getenv("CORS_ORIGINS", "*").split(",") if o.strip()]
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=cors_origins,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["content-type", "authorization"],
+    max_age=600,
 )
 
+# Write-heavy collections are inserted in small batches
+message_writer = BatchWriter("message")
+dailylog_writer = BatchWriter("dailylog")
+
+@app.on_event("startup")
+async def startup():
+    database.connect()
+    # Failures are logged rather than raised, so /test can still report the problem
+    await create_indexes()
+    message_writer.start()
+    dailylog_writer.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await message_writer.stop()
+    await dailylog_writer.stop()
+    database.close()
+
+# Projections for list endpoints (summary fields only)
+USER_LIST_FIELDS = {"name": 1, "email": 1, "role": 1, "trainer_id": 1}
+WORKOUT_PLAN_SUMMARY_FIELDS = {"title": 1, "goal": 1, "duration_weeks": 1, "is_active": 1, "trainer_id": 1, "client_id": 1}
+MEAL_PLAN_SUMMARY_FIELDS = {"title": 1, "daily_calorie_target": 1, "is_active": 1, "trainer_id": 1, "client_id": 1}
+
+# Serializers built once at import time
+USER_LIST_ADAPTER = TypeAdapter(List[UserOut])
+
 # Helpers
 
+_HEX_DIGITS = frozenset("0123456789abcdefABCDEF")
+
+@lru_cache(maxsize=4096)
+def _oid(id_str: str) -> ObjectId:
+    return ObjectId(id_str)
+
 def oid(id_str: str) -> ObjectId:
-    try:
-        return ObjectId(id_str)
-    except Exception:
+    if len(id_str) != 24 or not _HEX_DIGITS.issuperset(id_str):
         raise HTTPException(status_code=400, detail="Invalid ID format")
+    return _oid(id_str)
+
+async def stream_json_array(first, cursor):
+    """Encode cursor documents one at a time into a JSON array"""
+    yield b"["
+    if first is not None:
+        yield orjson.dumps(first, option=ORJSON_OPTIONS)
+        async for doc in cursor:
+            yield b","
+            yield orjson.dumps(doc, option=ORJSON_OPTIONS)
+    yield b"]"
+
+async def stream_documents(cursor) -> StreamingResponse:
+    # Pull the first batch before committing to a 200 so query errors still become error responses
+    first = await anext(cursor, None)
+    return StreamingResponse(stream_json_array(first, cursor), media_type="application/json")
+
+# A user's role never changes, so connect_client can skip re-reading the trainer
+_role_cache = TTLCache(maxsize=10_000, ttl=60)
+
+async def get_role_cached(user_oid: ObjectId) -> Optional[str]:
+    """Look up a user's role, hitting Mongo only on a cache miss"""
+    role = _role_cache.get(user_oid)
+    if role is None:
+        doc = await database.db["user"].find_one({"_id": user_oid}, {"role": 1})
+        if doc is None:
+            return None
+        role = _role_cache[user_oid] = doc.get("role")
+    return role
+
+async def find_trainer_and_client(trainer_id: str, client_id: str):
+    """Fetch a trainer and a client in a single round-trip"""
+    trainer_oid, client_oid = oid(trainer_id), oid(client_id)
+    trainer = client = None
+    cursor = database.db["user"].find({"_id": {"$in": [trainer_oid, client_oid]}}, {"role": 1, "trainer_id": 1})
+    async for doc in cursor:
+        if doc["_id"] == trainer_oid and doc.get("role") == "trainer":
+            trainer = doc
+        if doc["_id"] == client_oid and doc.get("role") == "client":
+            client = doc
+    return trainer, client
 
 # Health and schema endpoints
 @app.get("/")
-def root():
+async def root():
     return {"message": "Gym Coach Platform API"}
 
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -43,13 +134,13 @@ def test_database():
     }
 
     try:
-        if db is not None:
+        if database.db is not None:
             response["database"] = "✅ Available"
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
-            response["database_name"] = db.name if hasattr(db, 'name') else "✅ Connected"
+            response["database_name"] = database.db.name if hasattr(database.db, 'name') else "✅ Connected"
             response["connection_status"] = "Connected"
             try:
-                collections = db.list_collection_names()
+                collections = await database.db.list_collection_names()
                 response["collections"] = collections[:10]
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
@@ -62,116 +153,102 @@ def test_database():
     return response
 
 # Users
-@app.post("/api/users", response_model=dict)
-def create_user(user: User):
+@app.post("/api/users")
+async def create_user(user: User):
     user_dict = user.model_dump()
-    # Ensure unique email
-    if db["user"].find_one({"email": user.email}):
+    # Unique index on email rejects duplicates atomically; fall back to a lookup if it could not be created
+    if not database.unique_email_index and await database.db["user"].find_one({"email": user.email}, {"_id": 1}):
+        raise HTTPException(status_code=400, detail="Email already exists")
+    try:
+        new_id = await create_document("user", user_dict)
+    except DuplicateKeyError:
         raise HTTPException(status_code=400, detail="Email already exists")
-    new_id = create_document("user", user_dict)
     return {"id": new_id}
 
-@app.get("/api/users", response_model=List[dict])
-def list_users(role: Optional[str] = None):
+@app.get("/api/users")
+async def list_users(role: Optional[str] = None):
     query = {"role": role} if role else {}
-    items = get_documents("user", query)
-    for i in items:
-        i["id"] = str(i.pop("_id"))
-    return items
-
-@app.post("/api/connect", response_model=dict)
-def connect_client(trainer_id: str, client_email: str):
-    trainer = db["user"].find_one({"_id": oid(trainer_id), "role": "trainer"})
-    if not trainer:
+    items = await get_documents("user", query, projection=USER_LIST_FIELDS)
+    # The adapter already emits the final JSON bytes, so hand them over without re-encoding
+    return Response(content=USER_LIST_ADAPTER.dump_json(items), media_type="application/json")
+
+@app.post("/api/connect")
+async def connect_client(trainer_id: str, client_email: str):
+    trainer_oid = oid(trainer_id)
+    if await get_role_cached(trainer_oid) != "trainer":
         raise HTTPException(status_code=404, detail="Trainer not found")
-    client = db["user"].find_one({"email": client_email, "role": "client"})
+    client = await database.db["user"].find_one({"email": client_email, "role": "client"})
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
-    db["user"].update_one({"_id": client["_id"]}, {"$set": {"trainer_id": str(trainer["_id"])}})
+    await database.db["user"].update_one({"_id": client["_id"]}, {"$set": {"trainer_id": str(trainer_oid)}})
     return {"status": "connected"}
 
 # Workout Plans
-@app.post("/api/workout-plans", response_model=dict)
-def create_workout_plan(plan: WorkoutPlan):
+@app.post("/api/workout-plans")
+async def create_workout_plan(plan: WorkoutPlan):
     # Verify trainer-client relationship
-    trainer = db["user"].find_one({"_id": oid(plan.trainer_id), "role": "trainer"})
-    client = db["user"].find_one({"_id": oid(plan.client_id), "role": "client"})
+    trainer, client = await find_trainer_and_client(plan.trainer_id, plan.client_id)
     if not trainer or not client:
         raise HTTPException(status_code=400, detail="Invalid trainer or client")
     if client.get("trainer_id") not in (plan.trainer_id, str(trainer["_id"])):
         raise HTTPException(status_code=403, detail="Client not connected to trainer")
-    new_id = create_document("workoutplan", plan)
+    new_id = await create_document("workoutplan", plan)
     return {"id": new_id}
 
-@app.get("/api/workout-plans", response_model=List[dict])
-def list_workout_plans(trainer_id: Optional[str] = None, client_id: Optional[str] = None, active: bool = True):
+@app.get("/api/workout-plans", response_class=UTCORJSONResponse)
+async def list_workout_plans(trainer_id: Optional[str] = None, client_id: Optional[str] = None, active: bool = True, full: bool = False):
     q = {"is_active": active}
     if trainer_id:
         q["trainer_id"] = trainer_id
     if client_id:
         q["client_id"] = client_id
-    items = get_documents("workoutplan", q)
-    for i in items:
-        i["id"] = str(i.pop("_id"))
-    return items
+    items = await get_documents("workoutplan", q, projection=None if full else WORKOUT_PLAN_SUMMARY_FIELDS)
+    return UTCORJSONResponse(content=items)
 
 # Meal Plans
-@app.post("/api/meal-plans", response_model=dict)
-def create_meal_plan(plan: MealPlan):
-    trainer = db["user"].find_one({"_id": oid(plan.trainer_id), "role": "trainer"})
-    client = db["user"].find_one({"_id": oid(plan.client_id), "role": "client"})
+@app.post("/api/meal-plans")
+async def create_meal_plan(plan: MealPlan):
+    trainer, client = await find_trainer_and_client(plan.trainer_id, plan.client_id)
     if not trainer or not client:
         raise HTTPException(status_code=400, detail="Invalid trainer or client")
     if client.get("trainer_id") not in (plan.trainer_id, str(trainer["_id"])):
         raise HTTPException(status_code=403, detail="Client not connected to trainer")
-    new_id = create_document("mealplan", plan)
+    new_id = await create_document("mealplan", plan)
     return {"id": new_id}
 
-@app.get("/api/meal-plans", response_model=List[dict])
-def list_meal_plans(trainer_id: Optional[str] = None, client_id: Optional[str] = None, active: bool = True):
+@app.get("/api/meal-plans", response_class=UTCORJSONResponse)
+async def list_meal_plans(trainer_id: Optional[str] = None, client_id: Optional[str] = None, active: bool = True, full: bool = False):
     q = {"is_active": active}
     if trainer_id:
         q["trainer_id"] = trainer_id
     if client_id:
         q["client_id"] = client_id
-    items = get_documents("mealplan", q)
-    for i in items:
-        i["id"] = str(i.pop("_id"))
-    return items
+    items = await get_documents("mealplan", q, projection=None if full else MEAL_PLAN_SUMMARY_FIELDS)
+    return UTCORJSONResponse(content=items)
 
 # Messages (simple chat history)
-class MessageCreate(BaseModel):
-    conversation_id: str
-    sender_id: str
-    content: str
-
-@app.post("/api/messages", response_model=dict)
-def send_message(payload: MessageCreate):
-    msg = Message(**payload.model_dump())
-    new_id = create_document("message", msg)
+@app.post("/api/messages")
+async def send_message(msg: Message):
+    # Read receipts are server-controlled; new messages always start unread
+    new_id = await message_writer.insert({**msg.model_dump(), "read": False})
     return {"id": new_id}
 
-@app.get("/api/messages", response_model=List[dict])
-def get_messages(conversation_id: str, limit: int = 50):
-    items = get_documents("message", {"conversation_id": conversation_id}, limit=limit)
-    for i in items:
-        i["id"] = str(i.pop("_id"))
-    return items
+@app.get("/api/messages", response_class=UTCORJSONResponse)
+async def get_messages(conversation_id: str, limit: int = Query(50, ge=0)):
+    return await stream_documents(find_documents("message", {"conversation_id": conversation_id}, limit=limit))
 
 # Daily logs for calories/weight
-@app.post("/api/logs", response_model=dict)
-def add_log(log: DailyLog):
-    new_id = create_document("dailylog", log)
+@app.post("/api/logs")
+async def add_log(log: DailyLog):
+    new_id = await dailylog_writer.insert(log)
     return {"id": new_id}
 
-@app.get("/api/logs", response_model=List[dict])
-def list_logs(client_id: str, limit: int = 30):
-    items = get_documents("dailylog", {"client_id": client_id}, limit=limit)
-    for i in items:
-        i["id"] = str(i.pop("_id"))
-    return items
+@app.get("/api/logs", response_class=UTCORJSONResponse)
+async def list_logs(client_id: str, limit: int = Query(30, ge=0)):
+    return await stream_documents(find_documents("dailylog", {"client_id": client_id}, limit=limit))
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers, loop="uvloop", http="httptools")
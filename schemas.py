@@ -5,34 +5,51 @@ Each Pydantic model maps to a MongoDB collection (lowercased class name).
 Use these for validation in your FastAPI endpoints.
 """
 from __future__ import annotations
-from pydantic import BaseModel, Field, EmailStr
-from typing import Optional, List, Literal, Dict
+import re
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field
+from typing import Optional, List, Literal, Dict, Annotated
+from typing_extensions import TypedDict
 from datetime import date
 
 Role = Literal["trainer", "client"]
 
-class User(BaseModel):
+EMAIL_RE = re.compile(r"^[^@\s]{1,64}@[^@\s]{1,255}\.[^@\s]{2,}$")
+
+def _check_email(value: str) -> str:
+    if len(value) > 320 or not EMAIL_RE.fullmatch(value):
+        raise ValueError("value is not a valid email address")
+    # Domains are case-insensitive; normalize so the unique index catches duplicates
+    local, domain = value.rsplit("@", 1)
+    return f"{local}@{domain.lower()}"
+
+Email = Annotated[str, AfterValidator(_check_email)]
+
+class Schema(BaseModel):
+    """Base for request models; unknown fields are rejected up front"""
+    model_config = ConfigDict(extra="forbid")
+
+class User(Schema):
     name: str = Field(..., description="Full name")
-    email: EmailStr = Field(..., description="Email address")
+    email: Email = Field(..., description="Email address")
     role: Role = Field(..., description="User role: trainer or client")
     trainer_id: Optional[str] = Field(None, description="If client, the linked trainer's id")
     connection_code: Optional[str] = Field(None, description="Unique code clients can use to connect to a trainer")
     avatar_url: Optional[str] = Field(None, description="Profile image URL")
     bio: Optional[str] = Field(None, description="Short bio")
 
-class Exercise(BaseModel):
+class Exercise(Schema):
     name: str
     sets: int = Field(3, ge=1, le=10)
     reps: str = Field("10-12", description="Reps e.g. '8-10' or '12' or 'AMRAP'")
     rest_seconds: int = Field(60, ge=0)
     notes: Optional[str] = None
 
-class WorkoutDay(BaseModel):
+class WorkoutDay(Schema):
     day: Literal["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
     focus: Optional[str] = Field(None, description="e.g. Push, Pull, Legs")
     exercises: List[Exercise] = Field(default_factory=list)
 
-class WorkoutPlan(BaseModel):
+class WorkoutPlan(Schema):
     trainer_id: str
     client_id: str
     title: str
@@ -41,7 +58,7 @@ class WorkoutPlan(BaseModel):
     schedule: List[WorkoutDay] = Field(default_factory=list)
     is_active: bool = True
 
-class Meal(BaseModel):
+class Meal(Schema):
     name: str
     calories: int = Field(..., ge=0)
     protein_g: int = Field(0, ge=0)
@@ -50,7 +67,7 @@ class Meal(BaseModel):
     time_of_day: Optional[Literal["breakfast","lunch","dinner","snack"]] = None
     notes: Optional[str] = None
 
-class MealPlan(BaseModel):
+class MealPlan(Schema):
     trainer_id: str
     client_id: str
     title: str
@@ -58,13 +75,13 @@ class MealPlan(BaseModel):
     meals: List[Meal] = Field(default_factory=list)
     is_active: bool = True
 
-class Message(BaseModel):
+class Message(Schema):
     conversation_id: str = Field(..., description="trainerId_clientId")
     sender_id: str
     content: str
     read: bool = False
 
-class DailyLog(BaseModel):
+class DailyLog(Schema):
     client_id: str
     log_date: date
     calories: int = Field(0, ge=0)
@@ -73,7 +90,7 @@ class DailyLog(BaseModel):
     notes: Optional[str] = None
 
 # Dashboard summaries
-class DashboardSummary(BaseModel):
+class DashboardSummary(Schema):
     user_id: str
     role: Role
     connected: bool
@@ -81,3 +98,11 @@ class DashboardSummary(BaseModel):
     active_workout_plans: int = 0
     active_meal_plans: int = 0
     streak_days: int = 0
+
+# API response shapes (TypedDicts serialize plain Mongo dicts without re-validation)
+class UserOut(TypedDict):
+    id: str
+    name: str
+    email: str
+    role: Role
+    trainer_id: Optional[str]
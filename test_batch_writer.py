@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+from bson.errors import InvalidDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ServerSelectionTimeoutError
+
+import database
+
+
+class FakeCollection:
+    """Rejects documents whose "bad" field is set, like Mongo would."""
+
+    def __init__(self, bulk_error: bool):
+        self.bulk_error = bulk_error
+        self.saved = []
+
+    async def insert_many(self, docs, ordered):
+        bad = [i for i, doc in enumerate(docs) if doc.get("bad")]
+        if bad and not self.bulk_error:
+            raise InvalidDocument("cannot encode object")
+        self.saved.extend(doc for i, doc in enumerate(docs) if i not in bad)
+        if bad:
+            raise BulkWriteError({
+                "writeErrors": [{"index": i, "code": 11000, "errmsg": "E11000 duplicate key"} for i in bad],
+            })
+
+    async def insert_one(self, doc):
+        if doc.get("bad"):
+            raise InvalidDocument("cannot encode object")
+        self.saved.append(doc)
+
+
+async def insert_batch(collection, docs):
+    database.db = {"message": collection}
+    writer = database.BatchWriter("message", max_wait=0.05)
+    writer.start()
+    try:
+        return await asyncio.gather(*[writer.insert(doc) for doc in docs], return_exceptions=True)
+    finally:
+        await writer.stop()
+        database.db = None
+
+
+@pytest.mark.parametrize("bulk_error, error_cls", [(True, DuplicateKeyError), (False, InvalidDocument)])
+def test_partial_failure_only_fails_rejected_documents(bulk_error, error_cls):
+    collection = FakeCollection(bulk_error)
+    docs = [{"n": 0}, {"n": 1, "bad": True}, {"n": 2}]
+
+    results = asyncio.run(insert_batch(collection, docs))
+
+    assert isinstance(results[1], error_cls)
+    assert [r for i, r in enumerate(results) if i != 1] == [d["id_hex"] for d in collection.saved]
+    assert [d["n"] for d in collection.saved] == [0, 2]
+
+
+class UnreachableCollection:
+    def __init__(self):
+        self.calls = 0
+
+    async def insert_many(self, docs, ordered):
+        self.calls += 1
+        raise ServerSelectionTimeoutError("no servers available")
+
+    async def insert_one(self, doc):
+        self.calls += 1
+        raise ServerSelectionTimeoutError("no servers available")
+
+
+def test_connection_failure_fails_whole_batch_without_retrying():
+    collection = UnreachableCollection()
+
+    results = asyncio.run(insert_batch(collection, [{"n": 0}, {"n": 1}, {"n": 2}]))
+
+    assert all(isinstance(r, ServerSelectionTimeoutError) for r in results)
+    assert collection.calls == 1